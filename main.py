@@ -3,10 +3,13 @@ from solana.rpc.async_api import AsyncClient
 from solders.pubkey import Pubkey
 import json
 import os
+import random
 import sys
+import time
 import argparse
-import requests
-from datetime import date
+import httpx
+from datetime import date, datetime, timezone
+from email.utils import parsedate_to_datetime
 from dotenv import load_dotenv
 
 
@@ -16,20 +19,256 @@ VOTE_ACCOUNT = Pubkey.from_string("Vote111111111111111111111111111111111111111")
 STAKE_ACCOUNT = Pubkey.from_string("Stake11111111111111111111111111111111111111")
 RPC_URL = os.getenv("RPC_URL")
 VALIDATORS_APP_API_KEY = os.getenv("VALIDATORS_APP_API_KEY")
+# Base URLs can be overridden to point at a local mock server
+VALIDATORS_APP_URL = os.getenv("VALIDATORS_APP_URL", "https://www.validators.app/api/v1")
+STAKEWIZ_URL = os.getenv("STAKEWIZ_URL", "https://api.stakewiz.com")
+
+# Both networks and all pages share one bucket. validators.app does not
+# publish a per-token quota, so this is a conservative placeholder; a 429
+# with Retry-After pauses the bucket for as long as the server asks.
+VALIDATORS_APP_REQUESTS_PER_MINUTE = 60
+VALIDATORS_APP_RATE = VALIDATORS_APP_REQUESTS_PER_MINUTE / 60  # requests per second
+VALIDATORS_APP_BURST = 4
+VALIDATORS_APP_PAGE_SIZE = 1000
+VALIDATORS_APP_PAGE_CONCURRENCY = 4
+# Guard against a server that ignores `page` and keeps returning full pages
+VALIDATORS_APP_MAX_PAGES = 50
+
+HTTP_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+MAX_RETRIES = 6
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+# Longest Retry-After we are willing to wait out; anything longer aborts the run
+RETRY_AFTER_MAX = 300.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.not_before = 0.0
+        self.lock = asyncio.Lock()
+
+    def pause(self, delay):
+        # Hold back every caller, not just the one that was rate limited, and
+        # restart from an empty bucket so the burst doesn't trip the limit again
+        self.not_before = max(self.not_before, time.monotonic() + delay)
+        self.tokens = 0
+        self.updated = self.not_before
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.not_before:
+                    await asyncio.sleep(self.not_before - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def new_http_client():
+    # One pooled client shared by every non-RPC fetch in a run
+    return httpx.AsyncClient(
+        timeout=HTTP_TIMEOUT,
+        limits=httpx.Limits(max_connections=10, max_keepalive_connections=10),
+        headers={"Accept": "application/json"},
+    )
 
 
-def get_validators_app_data(network="mainnet"):
-    url = f"https://www.validators.app/api/v1/validators/{network}.json?order=stake"
-    r = requests.get(url, headers={"Token": VALIDATORS_APP_API_KEY})
-    return r.json()
-
-
-def save_validators_app_data(network="mainnet"):
-    validators_app_data = get_validators_app_data(network)
+def retry_after_delay(response):
+    retry_after = response.headers.get("Retry-After", "").strip()
+    if retry_after.isdigit():
+        return float(retry_after)
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt, response=None):
+    if response is not None:
+        delay = retry_after_delay(response)
+        if delay is not None:
+            return delay
+    # Exponential backoff with full jitter
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+async def send_with_retry(client, method, url, limiter=None, **kwargs):
+    """Send a request and return the streamed response; the caller must close it."""
+    for attempt in range(MAX_RETRIES + 1):
+        if limiter is not None:
+            await limiter.acquire()
+        request = client.build_request(method, url, **kwargs)
+        try:
+            response = await client.send(request, stream=True)
+        except httpx.TransportError as e:
+            if attempt == MAX_RETRIES:
+                raise
+            delay = backoff_delay(attempt)
+            print(f"{method} {url} failed ({e!r}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            continue
+
+        if response.status_code in RETRY_STATUSES and attempt < MAX_RETRIES:
+            await response.aclose()
+            delay = backoff_delay(attempt, response)
+            if delay > RETRY_AFTER_MAX:
+                raise RuntimeError(
+                    f"{method} {url} returned {response.status_code} with Retry-After of "
+                    f"{delay:.0f}s, longer than the {RETRY_AFTER_MAX:.0f}s limit"
+                )
+            if response.status_code == 429 and limiter is not None:
+                limiter.pause(delay)
+            print(f"{method} {url} returned {response.status_code}, retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            continue
+
+        if response.is_error:
+            await response.aclose()
+        response.raise_for_status()
+        return response
+
+
+async def gather_or_cancel(*coros):
+    # Like asyncio.gather, but a failure cancels the remaining tasks so none
+    # of them outlive the shared client or the file they are writing to
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    for task in tasks:
+        if not task.cancelled() and task.exception() is not None:
+            raise task.exception()
+    return [task.result() for task in tasks]
+
+
+def remove_if_exists(filename):
+    try:
+        os.remove(filename)
+    except FileNotFoundError:
+        pass
+
+
+async def get_validators_app_page(client, limiter, network, page):
+    url = f"{VALIDATORS_APP_URL}/validators/{network}.json"
+    params = {"order": "stake", "limit": VALIDATORS_APP_PAGE_SIZE, "page": page}
+    response = await send_with_retry(
+        client, "GET", url, limiter=limiter,
+        params=params, headers={"Token": VALIDATORS_APP_API_KEY or ""},
+    )
+    try:
+        await response.aread()
+    finally:
+        await response.aclose()
+    return response.json()
+
+
+async def save_validators_app_network(client, limiter, network, filename):
+    # Pages are fetched a window at a time and each record is written out as
+    # soon as its page arrives, so the full result is never held in memory
+    tmp_filename = f"{filename}.part"
+    count = 0
+    page = 1
+    previous_first = None
+    try:
+        with open(tmp_filename, "w") as f:
+            f.write("[")
+            done = False
+            while not done:
+                if page > VALIDATORS_APP_MAX_PAGES:
+                    raise RuntimeError(
+                        f"validators.app {network} returned more than "
+                        f"{VALIDATORS_APP_MAX_PAGES} full pages, giving up"
+                    )
+                # The total isn't known up front, so a whole window is scheduled
+                # at once. Pages are consumed in order and once a short page
+                # arrives the rest of the window is cancelled; pages still
+                # waiting on the limiter are never sent, so at most the
+                # requests already in flight are wasted.
+                tasks = [
+                    asyncio.ensure_future(get_validators_app_page(client, limiter, network, p))
+                    for p in range(page, min(page + VALIDATORS_APP_PAGE_CONCURRENCY,
+                                             VALIDATORS_APP_MAX_PAGES + 1))
+                ]
+                try:
+                    for p, task in enumerate(tasks, start=page):
+                        records = await task
+                        if records and records[0] == previous_first:
+                            raise RuntimeError(
+                                f"validators.app {network} page {p} repeats page {p - 1}, "
+                                "the server is ignoring pagination"
+                            )
+                        previous_first = records[0] if records else None
+                        for record in records:
+                            if count:
+                                f.write(", ")
+                            json.dump(record, f)
+                            count += 1
+                        if len(records) < VALIDATORS_APP_PAGE_SIZE:
+                            done = True
+                            break
+                finally:
+                    for task in tasks:
+                        task.cancel()
+                    await asyncio.gather(*tasks, return_exceptions=True)
+                page += len(tasks)
+            f.write("]")
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        remove_if_exists(tmp_filename)
+        raise
+
+    print(f"Wrote {count} {network} validators to file {filename}")
+    return count
+
+
+def validators_app_filename(network):
     today = date.today().strftime("%d-%m-%y")
-    filename = f"validators-app-data-{today}.json"
-    with open(filename, "w") as f:
-        json.dump(validators_app_data, f, indent=None)
+    if network == "mainnet":
+        return f"validators-app-data-{today}.json"
+    return f"validators-app-data-{network}-{today}.json"
+
+
+async def save_validators_app_data(client, networks=("mainnet",)):
+    limiter = TokenBucket(VALIDATORS_APP_RATE, VALIDATORS_APP_BURST)
+    await gather_or_cancel(*[
+        save_validators_app_network(client, limiter, network, validators_app_filename(network))
+        for network in networks
+    ])
+
+
+async def save_stakewiz_data(client, epoch_id):
+    now = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H-%M")
+    filename = f"stake-wiz-epoch-{epoch_id}-{now}.json"
+    tmp_filename = f"{filename}.part"
+    response = await send_with_retry(client, "GET", f"{STAKEWIZ_URL}/validators")
+    try:
+        with open(tmp_filename, "wb") as f:
+            async for chunk in response.aiter_bytes():
+                f.write(chunk)
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        remove_if_exists(tmp_filename)
+        raise
+    finally:
+        await response.aclose()
+
+    print(f"Wrote to file {filename}")
 
 
 async def get_epoch_info():
@@ -91,10 +330,31 @@ async def main(options):
         print("ERROR: cannot use --stake-only and --vote-only flags at the same time")
         sys.exit(1)
 
-    if options.save_validator_app_data:
-        save_validators_app_data()
+    if options.save_validator_app_data and options.save_stakewiz_data:
+        print("ERROR: cannot use --save-validator-app-data and --save-stakewiz-data flags at the same time")
+        sys.exit(1)
+
+    if options.network and not options.save_validator_app_data:
+        print("ERROR: --network can only be used with --save-validator-app-data")
+        sys.exit(1)
+
+    if options.epoch is not None and not options.save_stakewiz_data:
+        print("ERROR: --epoch can only be used with --save-stakewiz-data")
         sys.exit(1)
 
+    if options.save_validator_app_data:
+        async with new_http_client() as client:
+            await save_validators_app_data(client, options.network or ["mainnet"])
+        return
+
+    if options.save_stakewiz_data:
+        epoch_id = options.epoch
+        if epoch_id is None:
+            epoch_id = (await get_epoch_info()).epoch
+        async with new_http_client() as client:
+            await save_stakewiz_data(client, epoch_id)
+        return
+
     epoch_info = await get_epoch_info()
 
     epoch_id = epoch_info.epoch
@@ -134,6 +394,22 @@ def parseArguments():
         help="Save the validator app data locally",
         action="store_true"
     )
+    parser.add_argument(
+        "-n", "--network",
+        help="Network to save validator app data for (repeatable, default mainnet)",
+        action="append",
+        choices=["mainnet", "testnet"]
+    )
+    parser.add_argument(
+        "-ssw", "--save-stakewiz-data",
+        help="Save the stakewiz validator data locally",
+        action="store_true"
+    )
+    parser.add_argument(
+        "-e", "--epoch",
+        help="Epoch to use in the stakewiz filename instead of querying RPC_URL",
+        type=int
+    )
     args = parser.parse_args()
     return args
 
@@ -0,0 +1,253 @@
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import httpx
+import pytest
+
+import main
+
+
+@pytest.fixture(autouse=True)
+def fast_client(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(main, "VALIDATORS_APP_URL", "http://validators.test/api/v1")
+    monkeypatch.setattr(main, "STAKEWIZ_URL", "http://stakewiz.test")
+    monkeypatch.setattr(main, "VALIDATORS_APP_RATE", 1000.0)
+    monkeypatch.setattr(main, "VALIDATORS_APP_PAGE_SIZE", 10)
+    monkeypatch.setattr(main, "BACKOFF_BASE", 0.0)
+
+
+def run_with_transport(handler, coro_fn):
+    async def go():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await coro_fn(client)
+    return asyncio.run(go())
+
+
+def validators_handler(totals):
+    def handler(request):
+        network = request.url.path.rsplit("/", 1)[-1].removesuffix(".json")
+        page = int(request.url.params["page"])
+        limit = int(request.url.params["limit"])
+        start = (page - 1) * limit
+        records = [{"network": network, "i": i} for i in range(start, min(start + limit, totals[network]))]
+        return httpx.Response(200, json=records)
+    return handler
+
+
+def test_token_bucket_limits_rate():
+    async def go():
+        bucket = main.TokenBucket(rate=20, capacity=2)
+        start = time.monotonic()
+        for _ in range(6):
+            await bucket.acquire()
+        return time.monotonic() - start
+    # Two tokens are available up front, the other four refill at 20/s
+    assert asyncio.run(go()) >= 0.19
+
+
+def test_token_bucket_pause_holds_back_callers():
+    async def go():
+        bucket = main.TokenBucket(rate=1000, capacity=5)
+        bucket.pause(0.2)
+        start = time.monotonic()
+        await bucket.acquire()
+        return time.monotonic() - start
+    assert asyncio.run(go()) >= 0.19
+
+
+def test_backoff_delay_honours_long_retry_after():
+    response = httpx.Response(429, headers={"Retry-After": "300"})
+    assert main.backoff_delay(0, response) == 300.0
+
+
+@pytest.mark.parametrize("header", [
+    "Wed, 21 Oct 2015 07:28:00 GMT",
+    "Wed, 21 Oct 2015 07:28:00 -0000",
+])
+def test_backoff_delay_http_date_in_past(header):
+    response = httpx.Response(429, headers={"Retry-After": header})
+    assert main.backoff_delay(0, response) == 0.0
+
+
+def test_backoff_delay_http_date_in_future():
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=120)
+    response = httpx.Response(429, headers={"Retry-After": format_datetime(retry_at, usegmt=True)})
+    assert 100 < main.backoff_delay(0, response) <= 120
+
+
+def test_retry_after_over_limit_raises():
+    def handler(request):
+        return httpx.Response(429, headers={"Retry-After": "86400"})
+
+    bucket = main.TokenBucket(rate=1000, capacity=5)
+    with pytest.raises(RuntimeError, match="Retry-After of 86400s"):
+        run_with_transport(
+            handler, lambda client: main.get_validators_app_page(client, bucket, "mainnet", 1)
+        )
+    assert bucket.not_before == 0.0
+
+
+def test_retry_after_429_pauses_limiter():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(429, headers={"Retry-After": "0"})
+        return httpx.Response(200, json=[])
+
+    paused = []
+    bucket = main.TokenBucket(rate=1000, capacity=5)
+    bucket.pause = paused.append
+
+    records = run_with_transport(
+        handler, lambda client: main.get_validators_app_page(client, bucket, "mainnet", 1)
+    )
+    assert records == []
+    assert len(calls) == 2
+    assert paused == [0.0]
+
+
+def test_save_validators_app_data_writes_both_networks():
+    handler = validators_handler({"mainnet": 25, "testnet": 7})
+    run_with_transport(
+        handler, lambda client: main.save_validators_app_data(client, ["mainnet", "testnet"])
+    )
+
+    with open(main.validators_app_filename("mainnet")) as f:
+        mainnet = json.load(f)
+    with open(main.validators_app_filename("testnet")) as f:
+        testnet = json.load(f)
+    assert [r["i"] for r in mainnet] == list(range(25))
+    assert [r["i"] for r in testnet] == list(range(7))
+    assert {r["network"] for r in testnet} == {"testnet"}
+
+
+def test_exact_multiple_of_page_size_terminates():
+    handler = validators_handler({"mainnet": 20})
+    run_with_transport(handler, lambda client: main.save_validators_app_data(client))
+
+    with open(main.validators_app_filename("mainnet")) as f:
+        assert len(json.load(f)) == 20
+
+
+def test_short_page_cancels_unsent_pages(monkeypatch):
+    monkeypatch.setattr(main, "VALIDATORS_APP_RATE", 20.0)
+    monkeypatch.setattr(main, "VALIDATORS_APP_BURST", 1)
+    handler = validators_handler({"mainnet": 5})
+    pages = []
+
+    def counting_handler(request):
+        pages.append(int(request.url.params["page"]))
+        return handler(request)
+
+    run_with_transport(counting_handler, lambda client: main.save_validators_app_data(client))
+    assert pages == [1]
+
+
+def test_server_ignoring_page_raises(tmp_path):
+    def handler(request):
+        return httpx.Response(200, json=[{"i": i} for i in range(10)])
+
+    with pytest.raises(RuntimeError, match="ignoring pagination"):
+        run_with_transport(handler, lambda client: main.save_validators_app_data(client))
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_max_pages_guard_raises(monkeypatch, tmp_path):
+    monkeypatch.setattr(main, "VALIDATORS_APP_MAX_PAGES", 3)
+    handler = validators_handler({"mainnet": 1000})
+
+    with pytest.raises(RuntimeError, match="more than 3 full pages"):
+        run_with_transport(handler, lambda client: main.save_validators_app_data(client))
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_failing_network_cleans_up_both_part_files(tmp_path):
+    ok = validators_handler({"mainnet": 1000})
+
+    def handler(request):
+        if "testnet" in request.url.path:
+            return httpx.Response(401)
+        return ok(request)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        run_with_transport(
+            handler, lambda client: main.save_validators_app_data(client, ["mainnet", "testnet"])
+        )
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_save_stakewiz_data_streams_to_file(tmp_path):
+    def handler(request):
+        return httpx.Response(200, json=[{"vote_identity": "abc"}])
+
+    run_with_transport(handler, lambda client: main.save_stakewiz_data(client, 700))
+
+    [path] = tmp_path.iterdir()
+    assert path.name.startswith("stake-wiz-epoch-700-")
+    assert json.loads(path.read_text()) == [{"vote_identity": "abc"}]
+
+
+def test_save_stakewiz_data_cleans_up_part_file(tmp_path):
+    async def broken_body():
+        yield b"[{"
+        raise httpx.ReadError("connection reset")
+
+    def handler(request):
+        return httpx.Response(200, content=broken_body())
+
+    with pytest.raises(httpx.ReadError):
+        run_with_transport(handler, lambda client: main.save_stakewiz_data(client, 700))
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_stakewiz_with_epoch_skips_rpc(monkeypatch):
+    async def no_rpc():
+        raise AssertionError("get_epoch_info should not be called")
+
+    saved = []
+
+    async def fake_save(client, epoch_id):
+        saved.append(epoch_id)
+
+    monkeypatch.setattr(main, "get_epoch_info", no_rpc)
+    monkeypatch.setattr(main, "save_stakewiz_data", fake_save)
+    monkeypatch.setattr("sys.argv", ["main.py", "-ssw", "--epoch", "812"])
+
+    asyncio.run(main.main(main.parseArguments()))
+    assert saved == [812]
+
+
+@pytest.mark.parametrize("argv", [
+    ["-sva", "-ssw"],
+    ["-n", "testnet"],
+    ["-vo", "-e", "812"],
+])
+def test_ignored_flag_combinations_are_rejected(monkeypatch, argv):
+    async def no_rpc():
+        raise AssertionError("get_epoch_info should not be called")
+
+    monkeypatch.setattr(main, "get_epoch_info", no_rpc)
+    monkeypatch.setattr("sys.argv", ["main.py", *argv])
+
+    with pytest.raises(SystemExit) as excinfo:
+        asyncio.run(main.main(main.parseArguments()))
+    assert excinfo.value.code == 1
+
+
+def test_validators_app_success_exits_normally(monkeypatch):
+    saved = []
+
+    async def fake_save(client, networks):
+        saved.append(networks)
+
+    monkeypatch.setattr(main, "save_validators_app_data", fake_save)
+    monkeypatch.setattr("sys.argv", ["main.py", "-sva", "-n", "mainnet", "-n", "testnet"])
+
+    asyncio.run(main.main(main.parseArguments()))
+    assert saved == [["mainnet", "testnet"]]